@@ -1,9 +1,12 @@
 """
 FastAPI application for visualizing Voronoi diagrams of metro stations
 """
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from typing import Optional, Dict, Any
 import json
@@ -41,9 +44,16 @@ POPULAR_CITIES = [
     "Seoul, South Korea",
 ]
 
+# Cities pre-rendered at the same time; each one holds a whole metro network in
+# memory and runs its own Overpass query, so keep this small
+PRERENDER_WORKERS = int(os.environ.get("PRERENDER_WORKERS", 2))
+
 # File to track generation status
 STATUS_FILE = "generation_status.json"
 
+# Guards the in-memory status, which is also updated from background tasks
+status_lock = threading.Lock()
+
 
 def load_status():
     """Load map generation status"""
@@ -53,10 +63,18 @@ def load_status():
     return {}
 
 
-def save_status(status):
-    """Save map generation status"""
-    with open(STATUS_FILE, 'w') as f:
+def flush_status(status):
+    """Save map generation status atomically (write a temp file, then rename)"""
+    tmp_file = f"{STATUS_FILE}.tmp"
+    with open(tmp_file, 'w') as f:
         json.dump(status, f, indent=2)
+    os.replace(tmp_file, STATUS_FILE)
+
+
+@app.on_event("startup")
+async def startup():
+    """Load the generation status once and keep it in memory"""
+    app.state.status = load_status()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -70,7 +88,7 @@ async def root():
 @app.get("/api/popular-cities")
 async def get_popular_cities():
     """Return list of popular pre-rendered cities"""
-    status = load_status()
+    status = app.state.status
     cities_with_status = []
 
     for city in POPULAR_CITIES:
@@ -115,9 +133,9 @@ async def generate_map(request: Request, background_tasks: BackgroundTasks):
         output_file, city_slug = generator.generate_map(city, force_regenerate)
 
         # Update status
-        status = load_status()
-        status[city_slug] = {"ready": True, "city": city}
-        save_status(status)
+        with status_lock:
+            app.state.status[city_slug] = {"ready": True, "city": city}
+            flush_status(app.state.status)
 
         return {
             "success": True,
@@ -134,33 +152,87 @@ async def generate_map(request: Request, background_tasks: BackgroundTasks):
 
 
 @app.get("/api/map/{city_slug}")
-async def get_map(city_slug: str):
-    """Return the map HTML file"""
+async def get_map(city_slug: str, request: Request):
+    """Return the map HTML file (pre-compressed when the client accepts gzip)"""
     map_file = os.path.join(generator.maps_dir, f"{city_slug}_voronoi_{MAP_VERSION}.html")
 
     if not os.path.exists(map_file):
         raise HTTPException(status_code=404, detail="Map not found")
 
+    gzip_file = f"{map_file}.gz"
+    if "gzip" in request.headers.get("accept-encoding", "") and os.path.exists(gzip_file):
+        return FileResponse(
+            gzip_file,
+            media_type="text/html",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        )
+
     return FileResponse(map_file, media_type="text/html")
 
 
+# Deepest zoom level tiles are served for
+MAX_TILE_ZOOM = 22
+
+
+@app.get("/api/tiles/{city_slug}/{z}/{x}/{y}.pbf")
+def get_tile(city_slug: str, z: int, x: int, y: int):
+    """
+    Return a vector tile of the Voronoi layer of a large map
+
+    Tiles are built on the CPU, so this is a plain function run in the threadpool
+    instead of blocking the event loop.
+    """
+    if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    tile = generator.get_vector_tile(city_slug, z, x, y)
+
+    if tile is None:
+        raise HTTPException(status_code=404, detail="Tiles not found")
+
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile")
+
+
+def generate_city_map(city):
+    """Generate a city map in a worker process, which needs its own generator"""
+    return VoronoiMapGenerator().generate_map(city, force_regenerate=False)
+
+
 @app.post("/api/prerender-popular")
 async def prerender_popular_cities(background_tasks: BackgroundTasks):
     """
     Pre-render all popular cities in background
     """
     def prerender():
-        status = load_status()
-        for city in POPULAR_CITIES:
-            try:
+        status = app.state.status
+
+        # Each city runs in its own process so the GEOS work runs in parallel.
+        # Workers are spawned rather than forked from this multithreaded server
+        max_workers = max(1, min(len(POPULAR_CITIES), PRERENDER_WORKERS))
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {}
+            for city in POPULAR_CITIES:
                 print(f"Pre-rendering {city}...")
-                output_file, city_slug = generator.generate_map(city, force_regenerate=False)
-                status[city_slug] = {"ready": True, "city": city}
-                save_status(status)
-            except Exception as e:
-                print(f"Error pre-rendering {city}: {e}")
-                status[city_slug] = {"ready": False, "city": city, "error": str(e)}
-                save_status(status)
+                futures[executor.submit(generate_city_map, city)] = city
+
+            for future in as_completed(futures):
+                city = futures[future]
+                city_slug = generator._get_city_slug(city)
+                try:
+                    future.result()
+                    entry = {"ready": True, "city": city}
+                except Exception as e:
+                    print(f"Error pre-rendering {city}: {e}")
+                    entry = {"ready": False, "city": city, "error": str(e)}
+                with status_lock:
+                    status[city_slug] = entry
+
+        # Write the status file once, after all cities are done
+        with status_lock:
+            flush_status(status)
 
     background_tasks.add_task(prerender)
 
@@ -1,16 +1,63 @@
 """
 Module for generating Voronoi diagrams of metro stations
 """
+import functools
+import gzip
+import hashlib
+import json
 import os
-from typing import Optional, Tuple, List, Dict
+import shutil
+import string
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, List, Dict
 import osmnx as ox
 import geopandas as gpd
 import folium
-from shapely.ops import voronoi_diagram
+import mapbox_vector_tile
+import numpy as np
+import orjson
+import shapely
+from branca.element import MacroElement
+from folium.map import Layer
+from folium.plugins import VectorGridProtobuf
+from jinja2 import Template
+from pyproj import Transformer
+from shapely.geometry import Point
 from shapely.strtree import STRtree
 
 # Version for cache invalidation (increment when algorithm changes)
-MAP_VERSION = "v2"  # v2: fixed duplicate station merging
+MAP_VERSION = "v7"  # v7: only exactly rectangular boundaries are clipped by their bbox
+
+# OSM tags of the metro stations
+STATION_TAGS = {
+    "railway": "station",
+    "station": "subway"
+}
+
+# OSM tags of everything drawn on the map (stations, subway and train lines),
+# downloaded with a single Overpass query and split locally
+RAILWAY_TAGS = {
+    "railway": ["station", "subway", "rail", "light_rail"],
+    "station": "subway"
+}
+
+# Simplification tolerance of the Voronoi cells in meters (applied in UTM)
+VORONOI_SIMPLIFY_TOLERANCE = 5.0
+
+# Simplification tolerance of the rail lines in degrees (EPSG:4326), ~5 m
+LINE_SIMPLIFY_TOLERANCE = 5e-5
+
+# Grid size coordinates are snapped to before embedding, in degrees (~1 m)
+COORDINATE_PRECISION = 1e-5
+
+# Above this many cells the Voronoi layer is served as vector tiles instead of
+# being inlined in the map HTML
+VECTOR_TILE_THRESHOLD = 500
+VECTOR_TILE_EXTENT = 4096
+VECTOR_TILE_BUFFER = 4  # pixels of a 256 px tile
+
+# Half the width of the web mercator (EPSG:3857) world, in meters
+WEB_MERCATOR_HALF_WIDTH = 20037508.342789244
 
 # Paleta de cores para coloração de grafos (distinguíveis e agradáveis)
 VORONOI_COLORS = [
@@ -24,6 +71,188 @@ VORONOI_COLORS = [
     "#f781bf",  # rosa
 ]
 
+# Layer styles, serialized once per layer
+VORONOI_STYLE = {
+    "fillColor": "#3186cc",
+    "color": "#000000",
+    "weight": 0.7,
+    "fillOpacity": 0.4,
+}
+TRAIN_LINE_STYLE = {
+    "color": "#555555",
+    "weight": 2.5,
+    "opacity": 0.8
+}
+SUBWAY_LINE_STYLE = {
+    "color": "#17becf",
+    "weight": 3,
+    "opacity": 0.9
+}
+STATION_STYLE = {
+    "radius": 2,
+    "color": "black",
+    "fill": True,
+    "fillOpacity": 1
+}
+
+
+# Click handler showing the distance to the nearest station, built once and
+# filled in per map with the map variable name and the station columns
+CLICK_SCRIPT = string.Template("""
+<script>
+(function() {
+    // Wait for map to be ready
+    function initClickHandler() {
+        if (typeof $map_id === 'undefined') {
+            setTimeout(initClickHandler, 100);
+            return;
+        }
+
+        console.log('Interactive map loaded! Click anywhere to see distance to nearest station.');
+        var stations = $stations_json;
+        var names = stations.names;
+        var lats = stations.lats;
+        var lngs = stations.lngs;
+        console.log('Loaded ' + names.length + ' stations');
+        var currentMarker = null;
+        var currentLine = null;
+
+        // Haversine formula to calculate distance in meters
+        function calculateDistance(lat1, lng1, lat2, lng2) {
+            var R = 6371000; // Earth radius in meters
+            var dLat = (lat2 - lat1) * Math.PI / 180;
+            var dLng = (lng2 - lng1) * Math.PI / 180;
+            var a = Math.sin(dLat/2) * Math.sin(dLat/2) +
+                    Math.cos(lat1 * Math.PI / 180) * Math.cos(lat2 * Math.PI / 180) *
+                    Math.sin(dLng/2) * Math.sin(dLng/2);
+            var c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1-a));
+            return R * c;
+        }
+
+        // Find nearest station
+        function findNearestStation(lat, lng) {
+            var nearestIdx = -1;
+            var minD2 = Infinity;
+
+            // Within a city an equirectangular squared distance ranks
+            // stations like Haversine does, without trigonometry per station
+            var cosLat = Math.cos(lat * Math.PI / 180);
+            for (var i = 0; i < names.length; i++) {
+                var dx = (lngs[i] - lng) * cosLat;
+                var dy = lats[i] - lat;
+                var d2 = dx * dx + dy * dy;
+                if (d2 < minD2) {
+                    minD2 = d2;
+                    nearestIdx = i;
+                }
+            }
+
+            // Exact distance for display, computed once
+            var distance = calculateDistance(lat, lng, lats[nearestIdx], lngs[nearestIdx]);
+
+            return {
+                station: {
+                    name: names[nearestIdx],
+                    lat: lats[nearestIdx],
+                    lng: lngs[nearestIdx]
+                },
+                distance: Math.round(distance)
+            };
+        }
+
+        // Handle map click
+        $map_id.on('click', function(e) {
+            var lat = e.latlng.lat;
+            var lng = e.latlng.lng;
+
+            // Remove previous marker and line
+            if (currentMarker) {
+                $map_id.removeLayer(currentMarker);
+            }
+            if (currentLine) {
+                $map_id.removeLayer(currentLine);
+            }
+
+            // Find nearest station
+            var result = findNearestStation(lat, lng);
+            var walkingTime = Math.round(result.distance / 80); // ~80m/min walking speed
+
+            // Add dotted line to nearest station
+            currentLine = L.polyline(
+                [[lat, lng], [result.station.lat, result.station.lng]],
+                {
+                    color: '#333',
+                    weight: 1.5,
+                    opacity: 0.7,
+                    dashArray: '5, 8',
+                    lineCap: 'round'
+                }
+            ).addTo($map_id);
+
+            // Add marker at clicked location
+            currentMarker = L.marker([lat, lng], {
+                icon: L.divIcon({
+                    className: 'custom-marker',
+                    html: '<div style="background: #e74c3c; width: 12px; height: 12px; border-radius: 50%; border: 2px solid white; box-shadow: 0 0 4px rgba(0,0,0,0.5);"></div>',
+                    iconSize: [12, 12],
+                    iconAnchor: [6, 6]
+                })
+            }).addTo($map_id);
+
+            // Add popup
+            var popupContent = `
+                <div style="font-family: Georgia, serif; min-width: 180px;">
+                    <div style="font-size: 14px; font-weight: bold; margin-bottom: 8px; color: #333;">
+                        Clicked Location
+                    </div>
+                    <hr style="margin: 8px 0; border: none; border-top: 1px solid #ddd;">
+                    <div style="font-size: 13px; line-height: 1.6;">
+                        <div style="margin-bottom: 4px;">
+                            <span style="font-weight: bold;">Nearest Station:</span> $${result.station.name}
+                        </div>
+                        <div style="margin-bottom: 4px;">
+                            <span style="font-weight: bold;">Distance:</span> $${result.distance}m
+                        </div>
+                        <div>
+                            <span style="font-weight: bold;">Walking Time:</span> ~$${walkingTime} min
+                        </div>
+                    </div>
+                </div>
+            `;
+
+            currentMarker.bindPopup(popupContent, {
+                maxWidth: 250,
+                className: 'custom-popup'
+            }).openPopup();
+        });
+    }
+
+    // Start initialization
+    initClickHandler();
+})();
+</script>
+
+<style>
+.custom-popup .leaflet-popup-content-wrapper {
+    border-radius: 8px;
+    box-shadow: 0 3px 14px rgba(0,0,0,0.3);
+}
+.custom-popup .leaflet-popup-content {
+    margin: 12px;
+}
+</style>
+""")
+
+
+@functools.lru_cache(maxsize=256)
+def _geocode(city_name: str) -> gpd.GeoDataFrame:
+    """
+    Geocode a city with Nominatim, memoized for the lifetime of the process
+
+    The returned GeoDataFrame is shared between calls and must not be modified.
+    """
+    return ox.geocode_to_gdf(city_name)
+
 
 def _assign_colors_to_polygons(gdf: gpd.GeoDataFrame) -> List[str]:
     """
@@ -40,38 +269,232 @@ def _assign_colors_to_polygons(gdf: gpd.GeoDataFrame) -> List[str]:
     if n == 0:
         return []
 
-    # Build adjacency list (find which polygons touch each other)
-    adjacency: Dict[int, set] = {i: set() for i in range(n)}
+    # Build adjacency list (find which polygons touch each other) with a
+    # single bulk STRtree query: the tree prunes pairs whose bounding boxes
+    # don't overlap and GEOS refines the rest, all without a Python loop.
+    # Touching boundaries count as intersecting, so no separate touches check.
+    geoms = gdf.geometry.values
+    tree = STRtree(geoms)
+    left, right = tree.query(geoms, predicate="intersects")
 
-    for i in range(n):
-        for j in range(i + 1, n):
-            # Two polygons are adjacent if they touch or intersect
-            if gdf.geometry.iloc[i].touches(gdf.geometry.iloc[j]) or \
-               gdf.geometry.iloc[i].intersects(gdf.geometry.iloc[j]):
-                adjacency[i].add(j)
-                adjacency[j].add(i)
+    # Keep each pair once, then mirror it so both polygons list each other
+    pairs = left < right
+    sources = np.concatenate([left[pairs], right[pairs]])
+    targets = np.concatenate([right[pairs], left[pairs]])
 
-    # Greedy graph coloring
-    colors_assigned: Dict[int, int] = {}
+    # Group into sorted neighbor index arrays, one per polygon
+    order = np.lexsort((targets, sources))
+    splits = np.cumsum(np.bincount(sources, minlength=n))[:-1]
+    neighbors = np.split(targets[order].astype(np.int32), splits)
 
-    for i in range(n):
-        # Find colors used by adjacent polygons
-        neighbor_colors = {
-            colors_assigned[neighbor]
-            for neighbor in adjacency[i]
-            if neighbor in colors_assigned
-        }
+    # Greedy graph coloring (-1 marks polygons not colored yet)
+    colors_assigned = np.full(n, -1, dtype=np.int8)
+    all_colors = (1 << len(VORONOI_COLORS)) - 1
 
-        # Assign the first available color not used by neighbors
-        for color_idx in range(len(VORONOI_COLORS)):
-            if color_idx not in neighbor_colors:
-                colors_assigned[i] = color_idx
-                break
+    for i in range(n):
+        # Bitmask of the colors used by adjacent polygons
+        used = 0
+        for color_idx in colors_assigned[neighbors[i]].tolist():
+            if color_idx >= 0:
+                used |= 1 << color_idx
+
+        free = ~used & all_colors
+        if free:
+            # Assign the first available color (lowest free bit)
+            colors_assigned[i] = (free & -free).bit_length() - 1
         else:
-            # Fallback: if we run out of colors (shouldn't happen with 8 colors)
+            # Fallback: if we run out of colors (greedy coloring can need more
+            # than 8 for a polygon with many neighbors)
             colors_assigned[i] = i % len(VORONOI_COLORS)
 
-    return [VORONOI_COLORS[colors_assigned[i]] for i in range(n)]
+    return [VORONOI_COLORS[c] for c in colors_assigned]
+
+
+def _to_geojson(gdf: gpd.GeoDataFrame, properties: List[str]) -> str:
+    """
+    Serialize a GeoDataFrame as a GeoJSON FeatureCollection string.
+
+    Geometries are encoded by GEOS and properties by orjson, skipping the
+    Python dicts that GeoDataFrame.to_json builds for every feature.
+    """
+    geometries = shapely.to_geojson(gdf.geometry.values)
+    if properties:
+        records = gdf[properties].to_dict("records")
+    else:
+        records = [{}] * len(gdf)
+
+    features = ",".join(
+        '{"type":"Feature","properties":%s,"geometry":%s}'
+        # Escape "</" so a property value can't close the <script> tag
+        % (orjson.dumps(record).decode().replace("</", "<\\/"), geometry)
+        for record, geometry in zip(records, geometries)
+        if geometry is not None
+    )
+
+    return '{"type":"FeatureCollection","features":[%s]}' % features
+
+
+class FastGeoJson(Layer):
+    """
+    GeoJSON layer rendered straight into a Leaflet template.
+
+    Replacement for folium.GeoJson on the large layers: the data is serialized
+    once by _to_geojson instead of going through folium's per-feature style and
+    tooltip processing.
+
+    Args:
+        data: GeoDataFrame to display (reprojected to EPSG:4326 if needed)
+        style: Leaflet path style shared by every feature
+        name: Layer name shown in the layer control
+        fill_color_field: Property overriding the fill color of each feature
+        tooltip_field: Property shown in a tooltip when hovering a feature
+        tooltip_alias: Label displayed before the tooltip value
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson({{ this.data }}, {
+            style: (function() {
+                // Style objects are built once (per fill color) and shared by
+                // the features, Leaflet only copies their options
+                var style = {{ this.style }};
+                {%- if this.fill_color_field %}
+                var styles = {};
+                return function(feature) {
+                    var color = feature.properties[{{ this.fill_color_field|tojson }}];
+                    return styles[color] || (
+                        styles[color] = Object.assign({}, style, {fillColor: color})
+                    );
+                };
+                {%- else %}
+                return function() { return style; };
+                {%- endif %}
+            })()
+            {%- if this.tooltip_field %},
+            onEachFeature: function(feature, layer) {
+                layer.bindTooltip(function() {
+                    var content = document.createElement("div");
+                    var label = document.createElement("b");
+                    label.textContent = {{ this.tooltip_alias|tojson }} + " ";
+                    content.appendChild(label);
+                    content.appendChild(document.createTextNode(
+                        feature.properties[{{ this.tooltip_field|tojson }}]
+                    ));
+                    return content;
+                }, {sticky: true});
+            }
+            {%- endif %}
+        });
+        {% endmacro %}
+    """)
+
+    def __init__(
+        self,
+        data: gpd.GeoDataFrame,
+        style: Dict,
+        name: Optional[str] = None,
+        fill_color_field: Optional[str] = None,
+        tooltip_field: Optional[str] = None,
+        tooltip_alias: str = ""
+    ):
+        super().__init__(name=name, overlay=True)
+        self._name = "FastGeoJson"
+
+        if data.crs is not None and not data.crs.equals("EPSG:4326"):
+            data = data.to_crs(epsg=4326)
+
+        properties = [
+            field for field in (fill_color_field, tooltip_field) if field
+        ]
+        self.data = _to_geojson(data, properties)
+        self.style = json.dumps(style)
+        self.fill_color_field = fill_color_field
+        self.tooltip_field = tooltip_field
+        self.tooltip_alias = tooltip_alias
+
+
+class CircleMarkerGroup(Layer):
+    """
+    Circle markers built client-side from coordinate arrays.
+
+    Only the coordinates are embedded, instead of one folium.CircleMarker (or
+    GeoJSON feature) per point, and Leaflet creates the markers in one loop.
+
+    Args:
+        lats: Marker latitudes
+        lngs: Marker longitudes
+        style: Leaflet circle marker options shared by every marker
+        name: Layer name shown in the layer control
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.featureGroup(
+            {{ this.locations }}.map(function(location) {
+                return L.circleMarker(location, {{ this.style }});
+            })
+        );
+        {% endmacro %}
+    """)
+
+    def __init__(
+        self,
+        lats: np.ndarray,
+        lngs: np.ndarray,
+        style: Dict,
+        name: Optional[str] = None
+    ):
+        super().__init__(name=name, overlay=True)
+        self._name = "CircleMarkerGroup"
+
+        # Six decimals (~0.1 m) are plenty for a marker position
+        self.locations = orjson.dumps(
+            np.column_stack([lats, lngs]).round(6), option=orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+        self.style = json.dumps(style)
+
+
+class VectorGridTooltip(MacroElement):
+    """
+    Hover tooltip for the features of a parent vector tile layer.
+
+    VectorGrid layers cannot bind tooltips to their features, so the tooltip is
+    opened on the map at the pointer position when a feature is hovered. The
+    parent layer must be created with "interactive": true.
+
+    Args:
+        field: Feature property shown in the tooltip
+        alias: Label displayed before the property value
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function(grid) {
+            var tooltip = L.tooltip();
+            grid.on("mouseover", function(e) {
+                var content = document.createElement("div");
+                var label = document.createElement("b");
+                label.textContent = {{ this.alias|tojson }} + " ";
+                content.appendChild(label);
+                content.appendChild(document.createTextNode(
+                    e.layer.properties[{{ this.field|tojson }}]
+                ));
+                grid._map.openTooltip(tooltip.setContent(content), e.latlng);
+            });
+            grid.on("mouseout", function() {
+                if (grid._map) {
+                    grid._map.closeTooltip(tooltip);
+                }
+            });
+        })({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, field: str, alias: str = ""):
+        super().__init__()
+        self._name = "VectorGridTooltip"
+        self.field = field
+        self.alias = alias
 
 
 class VoronoiMapGenerator:
@@ -83,24 +506,168 @@ class VoronoiMapGenerator:
         os.makedirs(cache_dir, exist_ok=True)
         os.makedirs(maps_dir, exist_ok=True)
 
+        # Let OSMnx reuse raw Overpass/Nominatim responses across cities too
+        ox.settings.use_cache = True
+        ox.settings.cache_folder = os.path.join(cache_dir, "http")
+
+        # Voronoi cells served as vector tiles, loaded lazily in web mercator
+        # along with the modification time of the file they were read from
+        self._tile_sources: Dict[str, Tuple[int, gpd.GeoDataFrame, STRtree]] = {}
+
     def _get_city_slug(self, city_name: str) -> str:
         """Convert city name to file slug"""
         return city_name.lower().replace(",", "").replace(" ", "_")
 
-    def _fetch_stations(self, city: str) -> gpd.GeoDataFrame:
-        """Download metro stations from the city using OSM"""
-        station_tags = {
-            "railway": "station",
-            "station": "subway"
-        }
+    def _get_cache_key(self, city: str, layer: str, tags: Optional[Dict] = None) -> str:
+        """Return the cache key of an OSM layer of the city, including its query tags"""
+        key = f"{self._get_city_slug(city)}_{layer}"
+        if tags:
+            tags_json = json.dumps(tags, sort_keys=True).encode()
+            key += f"_{hashlib.sha1(tags_json).hexdigest()[:8]}"
+        return key
 
-        print(f"Downloading stations from {city}...")
-        gdf = ox.features_from_place(city, station_tags)
+    def _cached(
+        self,
+        key: str,
+        fetch: Callable[[], gpd.GeoDataFrame],
+        refresh: bool = False
+    ) -> gpd.GeoDataFrame:
+        """
+        Load a GeoDataFrame from the Parquet cache, or fetch and cache it
+
+        Args:
+            key: Cache key of the GeoDataFrame
+            fetch: Builds the GeoDataFrame when it is not cached
+            refresh: Fetch and overwrite the cached copy even if one exists
+        """
+        cache_path = os.path.join(self.cache_dir, f"{key}.parquet")
+        if os.path.exists(cache_path) and not refresh:
+            print(f"Loading {key} from cache: {cache_path}")
+            return gpd.read_parquet(cache_path)
+
+        gdf = fetch()
+        gdf.to_parquet(cache_path, compression="zstd")
+
+        return gdf
+
+    def _get_voronoi_key(self, city: str) -> str:
+        """
+        Return the cache key of the colored Voronoi cells of a map
+
+        It is derived from the keys of the stations and boundaries the cells are
+        built from, so cells are never reused with a different station set.
+        """
+        return self._get_cache_key(city, f"voronoi_{MAP_VERSION}", {
+            "stations": self._get_cache_key(city, "stations", RAILWAY_TAGS),
+            "boundary": self._get_cache_key(city, "boundary")
+        })
+
+    def _get_tile_source_path(self, city_slug: str) -> str:
+        """
+        Return the Parquet file the vector tiles of a large map are cut from
+
+        It is kept next to the map HTML rather than in the cache, so clearing the
+        cache never leaves a served map without its coverage layer.
+        """
+        return os.path.join(self.maps_dir, f"{city_slug}_voronoi_{MAP_VERSION}.tiles.parquet")
+
+    def _fetch_railway(
+        self, city: str, refresh: bool = False
+    ) -> Tuple[gpd.GeoDataFrame, gpd.GeoDataFrame, gpd.GeoDataFrame]:
+        """
+        Download the stations, subway lines and train lines of the city
+
+        All three layers come from a single Overpass query, split locally, so
+        the city polygon is geocoded and queried only once. If that query fails
+        (e.g. times out on a very large rail network), the stations are fetched
+        on their own and the line layers are left empty, to be retried next run.
+
+        Args:
+            city: City name
+            refresh: Download the layers again even if they are cached
+
+        Returns:
+            Tuple (stations, subway_lines, train_lines)
+        """
+        features = None
+        download_error = None
+
+        def download() -> gpd.GeoDataFrame:
+            # The combined query is attempted at most once per call
+            nonlocal features, download_error
+            if download_error is not None:
+                raise download_error
+            if features is None:
+                print(f"Downloading railway features from {city}...")
+                try:
+                    features = ox.features_from_place(city, RAILWAY_TAGS)
+                except Exception as e:
+                    download_error = e
+                    raise
+            return features
+
+        def key(layer: str) -> str:
+            return self._get_cache_key(city, layer, RAILWAY_TAGS)
+
+        def railway_tags() -> gpd.GeoDataFrame:
+            # Tags missing from every downloaded feature come back as empty columns
+            return download().reindex(columns=["railway", "station"])
+
+        def fetch_stations():
+            try:
+                tags = railway_tags()
+            except Exception as e:
+                # Stations are the subset of the combined query matching
+                # STATION_TAGS, so they can be cached under the same key
+                print(f"Warning: Could not download railway features: {e}")
+                print(f"Downloading stations from {city}...")
+                return self._process_stations(
+                    city, ox.features_from_place(city, STATION_TAGS)
+                )
+
+            is_station = (tags["railway"] == "station") | (tags["station"] == "subway")
+            return self._process_stations(city, download()[is_station])
+
+        def fetch_subway_lines():
+            lines_gdf = self._process_lines(
+                download()[railway_tags()["railway"] == "subway"]
+            )
+            print(f"{len(lines_gdf)} subway line geometries found")
+            return lines_gdf
 
+        def fetch_train_lines():
+            lines_gdf = self._process_lines(
+                download()[railway_tags()["railway"].isin(["rail", "light_rail"])]
+            )
+            print(f"{len(lines_gdf)} train line geometries found")
+            return lines_gdf
+
+        stations = self._cached(key("stations"), fetch_stations, refresh)
+
+        # Lines are only decoration, so a failure there must not abort the map
+        try:
+            subway_lines_gdf = self._cached(
+                key("subway_lines"), fetch_subway_lines, refresh
+            )
+        except Exception as e:
+            print(f"Warning: Could not get subway lines: {e}")
+            subway_lines_gdf = gpd.GeoDataFrame()
+
+        try:
+            train_lines_gdf = self._cached(
+                key("train_lines"), fetch_train_lines, refresh
+            )
+        except Exception as e:
+            print(f"Warning: Could not get train lines: {e}")
+            train_lines_gdf = gpd.GeoDataFrame()
+
+        return stations, subway_lines_gdf, train_lines_gdf
+
+    def _process_stations(self, city: str, gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        """Keep the named station points, merging the ones sharing a name"""
         # Filter only points with names
         stations = gdf[gdf.geometry.type == "Point"][["name", "geometry"]]
         stations = stations.dropna(subset=["name"])
-        stations["linha"] = "unknown"
 
         print(f"{len(stations)} raw stations found")
 
@@ -110,113 +677,158 @@ class VoronoiMapGenerator:
         # Merge duplicate stations (same name) into a single point at their centroid
         # This handles cases like multiple entries for "Lapa" station in São Paulo
         print(f"Merging duplicate station names...")
-        stations = stations.dissolve(by="name", aggfunc="first")
-        stations = stations.reset_index()
-
-        # Ensure all geometries are Points (dissolve might create MultiPoint)
-        # Convert to centroid to get a single point
-        def ensure_point(geom):
-            if geom.geom_type == 'MultiPoint':
-                return geom.centroid
-            elif geom.geom_type == 'Point':
-                return geom
-            else:
-                return geom.centroid
 
-        stations["geometry"] = stations.geometry.apply(ensure_point)
+        # Only the geometry needs aggregating, and the centroid keeps it a Point
+        merged = stations.groupby("name", sort=False).geometry.agg(
+            lambda points: points.iloc[0] if len(points) == 1
+            else shapely.centroid(shapely.union_all(points.to_numpy()))
+        )
+        stations = gpd.GeoDataFrame(
+            {"name": merged.index, "linha": "unknown", "geometry": merged.to_numpy()},
+            crs=stations.crs
+        )
 
         print(f"{len(stations)} unique stations after merging duplicates")
 
         return stations
 
-    def _fetch_subway_lines(self, city: str) -> gpd.GeoDataFrame:
-        """Download subway lines from the city"""
-        print("Downloading subway lines...")
-
-        line_tags = {
-            "railway": "subway"
-        }
-
-        lines_gdf = ox.features_from_place(city, line_tags)
-
-        # Filter only lines
+    def _process_lines(self, lines_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        """Keep the rail line geometries, simplified for display"""
+        # Filter only lines (only the geometry is rendered, so drop OSM tags)
         lines_gdf = lines_gdf[
             lines_gdf.geometry.type.isin(["LineString", "MultiLineString"])
-        ]
+        ][["geometry"]]
 
         lines_gdf = lines_gdf.to_crs(epsg=4326)
+        lines_gdf["geometry"] = shapely.set_precision(
+            shapely.simplify(
+                lines_gdf.geometry.values,
+                tolerance=LINE_SIMPLIFY_TOLERANCE,
+                preserve_topology=True
+            ),
+            COORDINATE_PRECISION
+        )
 
-        print(f"{len(lines_gdf)} subway line geometries found")
+        # Drop short segments that collapse on the grid
+        lines_gdf = lines_gdf[~lines_gdf.geometry.is_empty]
 
         return lines_gdf
 
-    def _fetch_train_lines(self, city: str) -> gpd.GeoDataFrame:
-        """Download train/rail lines from the city"""
-        print("Downloading train lines...")
-
-        line_tags = {
-            "railway": ["rail", "light_rail"]
-        }
-
-        try:
-            lines_gdf = ox.features_from_place(city, line_tags)
+    def _fetch_city_boundary(
+        self, city: str, refresh: bool = False
+    ) -> Tuple[gpd.GeoDataFrame, Point]:
+        """Geocode the city boundaries using OSM, along with their center"""
+        def fetch():
+            print(f"Geocoding boundaries of {city}...")
+            return _geocode(city)[["geometry"]]
 
-            # Filter only lines
-            lines_gdf = lines_gdf[
-                lines_gdf.geometry.type.isin(["LineString", "MultiLineString"])
-            ]
+        city_gdf = self._cached(self._get_cache_key(city, "boundary"), fetch, refresh)
 
-            lines_gdf = lines_gdf.to_crs(epsg=4326)
+        # Geocoded boundaries are already in EPSG:4326, the CRS of the map
+        city_center = city_gdf.geometry.iloc[0].centroid
 
-            print(f"{len(lines_gdf)} train line geometries found")
-
-            return lines_gdf
-        except Exception:
-            return gpd.GeoDataFrame()
+        return city_gdf, city_center
 
     def _create_voronoi(
         self,
         stations: gpd.GeoDataFrame,
-        city: str
+        city_gdf: gpd.GeoDataFrame
     ) -> gpd.GeoDataFrame:
-        """Create Voronoi polygons for the stations"""
-        # Reproject to UTM
-        stations_utm = stations.to_crs(stations.estimate_utm_crs())
-
-        # Create Voronoi diagram
-        points = stations_utm.geometry.union_all()
-        vor = voronoi_diagram(points)
-
-        # Get city boundaries
-        city_gdf = ox.geocode_to_gdf(city).to_crs(stations_utm.crs)
-        city_geom = city_gdf.geometry.iloc[0]
-
-        # Clip polygons by city boundaries
-        vor_polys = [
-            poly.intersection(city_geom)
-            for poly in vor.geoms
-            if not poly.is_empty
-        ]
+        """
+        Create Voronoi polygons for the stations, clipped by the city boundaries
 
-        # Associate each polygon with the nearest station
-        geoms = stations_utm.geometry.tolist()
-        tree = STRtree(geoms)
+        Args:
+            stations: Station points
+            city_gdf: City boundaries
+        """
+        # Reproject to UTM (the CRS is estimated once and shared with the boundaries)
+        utm_crs = stations.estimate_utm_crs()
+        stations_utm = stations.to_crs(utm_crs)
+
+        # GEOS cannot build an ordered diagram when two sites share the same
+        # coordinates, so keep only the first station at each location
+        coords = shapely.get_coordinates(stations_utm.geometry.values)
+        _, first = np.unique(coords, axis=0, return_index=True)
+        first.sort()
+        stations_utm = stations_utm.iloc[first]
+
+        # Create Voronoi diagram straight from the coordinate array; with
+        # ordered=True the i-th cell belongs to the i-th station, so no
+        # nearest-station lookup is needed afterwards
+        points = shapely.multipoints(coords[first])
+        polys = shapely.get_parts(shapely.voronoi_polygons(points, ordered=True))
+
+        # Project the city boundaries to the same UTM zone
+        city_geom = city_gdf.to_crs(utm_crs).geometry.iloc[0]
+
+        # Geocoding can return a point or a line instead of an area, which no
+        # cell can be clipped by
+        bounds = city_geom.bounds
+        bbox = shapely.box(*bounds)
+        if bbox.area == 0:
+            raise ValueError("The city boundaries do not enclose any area")
+
+        # Rectangular boundaries are clipped exactly by the much cheaper
+        # rectangle clipping
+        if city_geom.equals(bbox):
+            vor_polys = shapely.clip_by_rect(polys, *bounds)
+        else:
+            # Clip polygons by city boundaries in a single vectorized GEOS call,
+            # preparing the boundary once so every predicate reuses its index
+            shapely.prepare(city_geom)
+
+            # Cells lying entirely inside the city are kept as-is; only the ones
+            # crossing the boundary pay for the full intersection. The cheap test
+            # against the bounding box spares most cells the covers test: cells
+            # not strictly inside the bbox always take the intersection path,
+            # which is correct (even for a cell touching a bbox edge that lies on
+            # the boundary), just not the cheapest
+            vor_polys = polys.copy()
+            shapely.prepare(bbox)
+            crossing = ~shapely.contains_properly(bbox, polys)
+            crossing[~crossing] = ~shapely.covers(city_geom, polys[~crossing])
+
+            # The outer cells of the diagram reach far beyond the city, so trim
+            # them to its bounds with the cheap rectangle clipping first
+            trimmed = shapely.clip_by_rect(polys[crossing], *bounds)
+            vor_polys[crossing] = shapely.intersection(trimmed, city_geom)
+
+        # Drop nearly collinear vertices left by the boundary clipping while still
+        # in UTM, so the tolerance is in meters; the fast non topology preserving
+        # path is fine as set_precision below repairs any invalid output
+        vor_polys = shapely.simplify(
+            vor_polys, VORONOI_SIMPLIFY_TOLERANCE, preserve_topology=False
+        )
 
-        records = []
-        for poly in vor_polys:
-            centroid = poly.centroid
-            idx = tree.nearest(centroid)
+        # Drop cells of stations lying outside the city boundaries
+        keep = ~shapely.is_empty(vor_polys)
+        names = stations_utm["name"].values[keep]
 
-            records.append({
-                "name": stations_utm.iloc[idx]["name"],
-                "linha": stations_utm.iloc[idx]["linha"],
-                "geometry": poly
-            })
+        # Reproject the cell coordinates straight through pyproj, without the
+        # per-geometry GeoDataFrame machinery
+        to_wgs84 = Transformer.from_crs(utm_crs, "EPSG:4326", always_xy=True)
+        vor_polys = shapely.transform(
+            vor_polys[keep],
+            lambda coords: np.column_stack(to_wgs84.transform(coords[:, 0], coords[:, 1]))
+        )
 
-        voronoi_gdf = gpd.GeoDataFrame(records, crs=stations_utm.crs)
-        voronoi_gdf = voronoi_gdf.to_crs(epsg=4326)
+        # Round coordinates to ~1 m once in EPSG:4326, the CRS they are embedded
+        # in, dropping slivers that collapse on the grid
+        vor_polys = shapely.set_precision(vor_polys, COORDINATE_PRECISION)
+        keep = ~shapely.is_empty(vor_polys)
+
+        voronoi_gdf = gpd.GeoDataFrame(
+            {
+                "name": names[keep],
+                "geometry": vor_polys[keep],
+            },
+            crs="EPSG:4326"
+        )
+
+        # Assign colors to polygons (adjacent polygons get different colors)
+        voronoi_gdf["_fill_color"] = _assign_colors_to_polygons(voronoi_gdf)
 
-        return voronoi_gdf, city_gdf
+        return voronoi_gdf
 
     def _create_map(
         self,
@@ -224,240 +836,193 @@ class VoronoiMapGenerator:
         stations: gpd.GeoDataFrame,
         subway_lines_gdf: gpd.GeoDataFrame,
         train_lines_gdf: gpd.GeoDataFrame,
-        city_gdf: gpd.GeoDataFrame
+        city_center: Point,
+        city_slug: str
     ) -> folium.Map:
         """Create Folium map with Voronoi, stations and lines"""
-        city_center = city_gdf.to_crs(epsg=4326).geometry.centroid.iloc[0]
+        # Station coordinates, extracted once and shared by the layers using them
+        xs = shapely.get_x(stations.geometry.values)
+        ys = shapely.get_y(stations.geometry.values)
 
         m = folium.Map(
             location=[city_center.y, city_center.x],
             zoom_start=11
         )
 
-        # Assign colors to polygons (adjacent polygons get different colors)
-        polygon_colors = _assign_colors_to_polygons(voronoi_gdf)
-
-        # Add color column to GeoDataFrame for styling
-        voronoi_gdf = voronoi_gdf.copy()
-        voronoi_gdf["_fill_color"] = polygon_colors
-
-        # Add Voronoi polygons
-        folium.GeoJson(
-            voronoi_gdf,
-            style_function=lambda x: {
-                "fillColor": x["properties"].get("_fill_color", "#3186cc"),
-                "color": "#000000",
-                "weight": 0.7,
-                "fillOpacity": 0.4,
-            },
-            tooltip=folium.GeoJsonTooltip(
-                fields=["name"],
-                aliases=["Station"]
-            ),
-            name="Coverage areas"
-        ).add_to(m)
+        if len(voronoi_gdf) > VECTOR_TILE_THRESHOLD:
+            # Large metros: let Leaflet fetch only the vector tiles covering the
+            # viewport (served from the cached cells) instead of inlining them all
+            coverage = VectorGridProtobuf(
+                f"/api/tiles/{city_slug}/{{z}}/{{x}}/{{y}}.pbf",
+                "Coverage areas",
+                f"""{{
+                    "interactive": true,
+                    "vectorTileLayerStyles": {{
+                        "voronoi": (function() {{
+                            var styles = {{}};
+                            return function(properties) {{
+                                var color = properties._fill_color;
+                                return styles[color] || (styles[color] = Object.assign(
+                                    {{"fill": true}},
+                                    {json.dumps(VORONOI_STYLE)},
+                                    {{"fillColor": color}}
+                                ));
+                            }};
+                        }})()
+                    }}
+                }}"""
+            )
+            VectorGridTooltip("name", "Station").add_to(coverage)
+            coverage.add_to(m)
+        else:
+            # Add Voronoi polygons
+            FastGeoJson(
+                voronoi_gdf,
+                style=VORONOI_STYLE,
+                name="Coverage areas",
+                fill_color_field="_fill_color",
+                tooltip_field="name",
+                tooltip_alias="Station"
+            ).add_to(m)
 
         # Add train lines (gray, below subway)
         if len(train_lines_gdf) > 0:
-            folium.GeoJson(
+            FastGeoJson(
                 train_lines_gdf,
-                style_function=lambda x: {
-                    "color": "#555555",
-                    "weight": 2.5,
-                    "opacity": 0.8
-                },
+                style=TRAIN_LINE_STYLE,
                 name="Train lines"
             ).add_to(m)
 
         # Add subway lines (cyan, on top)
         if len(subway_lines_gdf) > 0:
-            folium.GeoJson(
+            FastGeoJson(
                 subway_lines_gdf,
-                style_function=lambda x: {
-                    "color": "#17becf",
-                    "weight": 3,
-                    "opacity": 0.9
-                },
+                style=SUBWAY_LINE_STYLE,
                 name="Subway lines"
             ).add_to(m)
 
-        # Add station points
-        for _, row in stations.iterrows():
-            folium.CircleMarker(
-                location=[row.geometry.y, row.geometry.x],
-                radius=2,
-                fill=True,
-                fill_opacity=1,
-                color="black"
-            ).add_to(m)
+        # Add station points as a single layer built from the coordinate arrays
+        CircleMarkerGroup(
+            ys,
+            xs,
+            STATION_STYLE,
+            name="Stations"
+        ).add_to(m)
 
         folium.LayerControl().add_to(m)
 
         # Add interactive click functionality
-        self._add_click_interactivity(m, stations)
+        self._add_click_interactivity(m, xs, ys, stations["name"].to_numpy())
 
         return m
 
-    def _add_click_interactivity(self, m: folium.Map, stations: gpd.GeoDataFrame):
+    def _get_tile_source(self, city_slug: str) -> Optional[Tuple[gpd.GeoDataFrame, STRtree]]:
+        """Load the cached Voronoi cells of a map in web mercator, with a spatial index"""
+        source_path = self._get_tile_source_path(city_slug)
+        try:
+            mtime = os.stat(source_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        # Reload when the map was regenerated, possibly by another process
+        source = self._tile_sources.get(city_slug)
+        if source is None or source[0] != mtime:
+            cells = gpd.read_parquet(source_path).to_crs(epsg=3857)
+            source = (mtime, cells, STRtree(cells.geometry.values))
+            self._tile_sources[city_slug] = source
+
+        return source[1], source[2]
+
+    def get_vector_tile(self, city_slug: str, z: int, x: int, y: int) -> Optional[bytes]:
+        """
+        Encode the Voronoi cells covering a web mercator tile
+
+        Args:
+            city_slug: Slug of a map generated with vector tiles
+            z, x, y: Tile coordinates
+
+        Returns:
+            Mapbox vector tile bytes, or None if the map has no tiled layer
+        """
+        source = self._get_tile_source(city_slug)
+        if source is None:
+            return None
+        cells, tree = source
+
+        # Tile bounds, padded by the buffer so polygon edges don't show at seams
+        tile_size = 2 * WEB_MERCATOR_HALF_WIDTH / 2 ** z
+        minx = -WEB_MERCATOR_HALF_WIDTH + x * tile_size
+        maxy = WEB_MERCATOR_HALF_WIDTH - y * tile_size
+        bounds = (minx, maxy - tile_size, minx + tile_size, maxy)
+        pad = tile_size * VECTOR_TILE_BUFFER / 256
+        padded = (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+
+        idxs = tree.query(shapely.box(*padded))
+        clipped = shapely.clip_by_rect(cells.geometry.values[idxs], *padded)
+
+        features = [
+            {
+                "geometry": geom,
+                "properties": {"name": name, "_fill_color": color}
+            }
+            for geom, name, color in zip(
+                clipped,
+                cells["name"].values[idxs],
+                cells["_fill_color"].values[idxs]
+            )
+            if not geom.is_empty
+        ]
+
+        return mapbox_vector_tile.encode(
+            [{"name": "voronoi", "features": features}],
+            default_options={
+                "quantize_bounds": bounds,
+                "extents": VECTOR_TILE_EXTENT
+            }
+        )
+
+    def _add_click_interactivity(
+        self,
+        m: folium.Map,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        names: np.ndarray
+    ):
         """Add click event to show distance to nearest station"""
-        import json
-
-        # Prepare station data for JavaScript
-        stations_data = []
-        for _, row in stations.iterrows():
-            stations_data.append({
-                'name': row['name'],
-                'lat': row.geometry.y,
-                'lng': row.geometry.x
-            })
+        # Prepare station data for JavaScript as parallel columns, so keys are
+        # not repeated for every station (6 decimals is ~0.1 m)
+        stations_data = {
+            'names': names.tolist(),
+            'lats': ys.round(6).tolist(),
+            'lngs': xs.round(6).tolist()
+        }
 
         # Convert to JSON string for embedding in JavaScript
-        stations_json = json.dumps(stations_data)
+        stations_json = json.dumps(stations_data, separators=(',', ':'))
 
         # Get the map variable name from Folium
         map_id = m.get_name()
 
         # Add custom JavaScript for click handling
-        click_script = f"""
-        <script>
-        (function() {{
-            // Wait for map to be ready
-            function initClickHandler() {{
-                if (typeof {map_id} === 'undefined') {{
-                    setTimeout(initClickHandler, 100);
-                    return;
-                }}
-
-                console.log('Interactive map loaded! Click anywhere to see distance to nearest station.');
-                var stations = {stations_json};
-                console.log('Loaded ' + stations.length + ' stations');
-                var currentMarker = null;
-                var currentLine = null;
-
-                // Haversine formula to calculate distance in meters
-                function calculateDistance(lat1, lng1, lat2, lng2) {{
-                    var R = 6371000; // Earth radius in meters
-                    var dLat = (lat2 - lat1) * Math.PI / 180;
-                    var dLng = (lng2 - lng1) * Math.PI / 180;
-                    var a = Math.sin(dLat/2) * Math.sin(dLat/2) +
-                            Math.cos(lat1 * Math.PI / 180) * Math.cos(lat2 * Math.PI / 180) *
-                            Math.sin(dLng/2) * Math.sin(dLng/2);
-                    var c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1-a));
-                    return R * c;
-                }}
-
-                // Find nearest station
-                function findNearestStation(lat, lng) {{
-                    var nearest = null;
-                    var minDistance = Infinity;
-
-                    stations.forEach(function(station) {{
-                        var distance = calculateDistance(lat, lng, station.lat, station.lng);
-                        if (distance < minDistance) {{
-                            minDistance = distance;
-                            nearest = station;
-                        }}
-                    }});
-
-                    return {{
-                        station: nearest,
-                        distance: Math.round(minDistance)
-                    }};
-                }}
-
-                // Handle map click
-                {map_id}.on('click', function(e) {{
-                    var lat = e.latlng.lat;
-                    var lng = e.latlng.lng;
-
-                    // Remove previous marker and line
-                    if (currentMarker) {{
-                        {map_id}.removeLayer(currentMarker);
-                    }}
-                    if (currentLine) {{
-                        {map_id}.removeLayer(currentLine);
-                    }}
-
-                    // Find nearest station
-                    var result = findNearestStation(lat, lng);
-                    var walkingTime = Math.round(result.distance / 80); // ~80m/min walking speed
-
-                    // Add dotted line to nearest station
-                    currentLine = L.polyline(
-                        [[lat, lng], [result.station.lat, result.station.lng]],
-                        {{
-                            color: '#333',
-                            weight: 1.5,
-                            opacity: 0.7,
-                            dashArray: '5, 8',
-                            lineCap: 'round'
-                        }}
-                    ).addTo({map_id});
-
-                    // Add marker at clicked location
-                    currentMarker = L.marker([lat, lng], {{
-                        icon: L.divIcon({{
-                            className: 'custom-marker',
-                            html: '<div style="background: #e74c3c; width: 12px; height: 12px; border-radius: 50%; border: 2px solid white; box-shadow: 0 0 4px rgba(0,0,0,0.5);"></div>',
-                            iconSize: [12, 12],
-                            iconAnchor: [6, 6]
-                        }})
-                    }}).addTo({map_id});
-
-                    // Add popup
-                    var popupContent = `
-                        <div style="font-family: Georgia, serif; min-width: 180px;">
-                            <div style="font-size: 14px; font-weight: bold; margin-bottom: 8px; color: #333;">
-                                Clicked Location
-                            </div>
-                            <hr style="margin: 8px 0; border: none; border-top: 1px solid #ddd;">
-                            <div style="font-size: 13px; line-height: 1.6;">
-                                <div style="margin-bottom: 4px;">
-                                    <span style="font-weight: bold;">Nearest Station:</span> ${{result.station.name}}
-                                </div>
-                                <div style="margin-bottom: 4px;">
-                                    <span style="font-weight: bold;">Distance:</span> ${{result.distance}}m
-                                </div>
-                                <div>
-                                    <span style="font-weight: bold;">Walking Time:</span> ~${{walkingTime}} min
-                                </div>
-                            </div>
-                        </div>
-                    `;
-
-                    currentMarker.bindPopup(popupContent, {{
-                        maxWidth: 250,
-                        className: 'custom-popup'
-                    }}).openPopup();
-                }});
-            }}
-
-            // Start initialization
-            initClickHandler();
-        }})();
-        </script>
-
-        <style>
-        .custom-popup .leaflet-popup-content-wrapper {{
-            border-radius: 8px;
-            box-shadow: 0 3px 14px rgba(0,0,0,0.3);
-        }}
-        .custom-popup .leaflet-popup-content {{
-            margin: 12px;
-        }}
-        </style>
-        """
+        click_script = CLICK_SCRIPT.substitute(map_id=map_id, stations_json=stations_json)
 
         # Add the script to the map
         m.get_root().html.add_child(folium.Element(click_script))
 
+    def _compress_map(self, output_file: str):
+        """Write a gzip-compressed copy of the map HTML next to it"""
+        with open(output_file, "rb") as f_in, \
+                gzip.open(f"{output_file}.gz", "wb", compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out)
+
     def generate_map(self, city: str, force_regenerate: bool = False) -> Tuple[str, str]:
         """
         Generate Voronoi map for a city
 
         Args:
             city: City name (e.g., "Rio de Janeiro, Brazil")
-            force_regenerate: If True, regenerate even if already in cache
+            force_regenerate: If True, regenerate even if already in cache,
+                downloading fresh OSM data instead of reusing any cached layer
 
         Returns:
             Tuple (file_path, city_slug)
@@ -470,34 +1035,59 @@ class VoronoiMapGenerator:
             print(f"Map already exists in cache: {output_file}")
             return output_file, city_slug
 
-        try:
-            # Download data
-            stations = self._fetch_stations(city)
+        # A forced regeneration must not be served the previous OSM data by the
+        # in-process geocoding memo or the OSMnx HTTP response cache either
+        use_http_cache = ox.settings.use_cache
+        if force_regenerate:
+            _geocode.cache_clear()
+            ox.settings.use_cache = False
 
-            # Try to download subway lines (may fail in some cities)
-            try:
-                subway_lines_gdf = self._fetch_subway_lines(city)
-            except Exception as e:
-                print(f"Warning: Could not download subway lines: {e}")
-                subway_lines_gdf = gpd.GeoDataFrame()
-
-            # Try to download train lines (may fail in some cities)
+        try:
+            # Download data (the Overpass query and the Nominatim geocoding are
+            # independent and mostly wait on the network, so run them concurrently)
             try:
-                train_lines_gdf = self._fetch_train_lines(city)
-            except Exception as e:
-                print(f"Warning: Could not download train lines: {e}")
-                train_lines_gdf = gpd.GeoDataFrame()
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    railway_future = executor.submit(
+                        self._fetch_railway, city, force_regenerate
+                    )
+                    boundary_future = executor.submit(
+                        self._fetch_city_boundary, city, force_regenerate
+                    )
+
+                    stations, subway_lines_gdf, train_lines_gdf = railway_future.result()
+                    city_gdf, city_center = boundary_future.result()
+            finally:
+                ox.settings.use_cache = use_http_cache
+
+            # Create Voronoi, or reuse the cells computed by a previous run
+            # (e.g. when only the map styling changed)
+            voronoi_gdf = self._cached(
+                self._get_voronoi_key(city),
+                lambda: self._create_voronoi(stations, city_gdf),
+                refresh=force_regenerate
+            )
 
-            # Create Voronoi
-            voronoi_gdf, city_gdf = self._create_voronoi(stations, city)
+            # Large maps fetch their coverage layer as tiles cut from these cells.
+            # Tiles may be read while this runs, so write a temp file, then rename
+            if len(voronoi_gdf) > VECTOR_TILE_THRESHOLD:
+                tile_source_path = self._get_tile_source_path(city_slug)
+                voronoi_gdf[["name", "_fill_color", "geometry"]].to_parquet(
+                    f"{tile_source_path}.tmp", compression="zstd"
+                )
+                os.replace(f"{tile_source_path}.tmp", tile_source_path)
 
             # Create map
             m = self._create_map(
-                voronoi_gdf, stations, subway_lines_gdf, train_lines_gdf, city_gdf
+                voronoi_gdf, stations, subway_lines_gdf, train_lines_gdf, city_center,
+                city_slug
             )
 
-            # Save
-            m.save(output_file)
+            # Render the map tree once and write it out, along with a gzip copy
+            # served to clients that accept it
+            html = m.get_root().render()
+            with open(output_file, "w", encoding="utf-8") as f:
+                f.write(html)
+            self._compress_map(output_file)
             print(f"Voronoi map saved to {output_file}")
 
             return output_file, city_slug